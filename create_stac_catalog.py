@@ -1,20 +1,103 @@
+import mmap
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
+from functools import lru_cache
 from pathlib import Path
 import json
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 import rasterio
 from rasterio.warp import transform_bounds
-from shapely.geometry import box, mapping
-import pystac
+
+try:
+    import orjson
+except ImportError:  # fall back to the stdlib serializer
+    orjson = None
+
+# Smaller files are cheaper to read than to map
+MMAP_MIN_SIZE = 64 * 1024
+
+# GDAL configuration shared by every batch of GeoTIFF header reads
+GDAL_ENV_OPTIONS = {"GDAL_CACHEMAX": 512, "CPL_VSIL_CURL_ALLOWED_EXTENSIONS": ".tif"}
+
+
+def read_json(path: Path) -> Dict:
+    """
+    Read a JSON file, using orjson when it is installed.
+
+    With orjson, files of at least MMAP_MIN_SIZE bytes are parsed straight
+    from a memory map.
+    """
+    with open(path, "rb") as f:
+        if orjson is None:
+            return json.loads(f.read())
+        if os.fstat(f.fileno()).st_size < MMAP_MIN_SIZE:
+            return orjson.loads(f.read())
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            with memoryview(mm) as view:
+                return orjson.loads(view)
+
+
+def write_json(path: Path, data: Dict, atomic: bool = False):
+    """
+    Write data to path as JSON indented by two spaces.
+
+    With atomic=True the JSON is written and synced to a temporary file that
+    then replaces path, so an interrupted write or a power loss never leaves a
+    truncated file behind.
+    """
+    if orjson is not None:
+        content = orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    else:
+        content = json.dumps(data, indent=2, ensure_ascii=False).encode("utf-8")
+
+    path = Path(path)
+    if not atomic:
+        path.write_bytes(content)
+        return
+
+    # Unique per process and thread so concurrent writers never share it
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+            # The data must be on disk before the rename that publishes it
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        # Only left over if the write or the rename failed
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+    # Persist the rename itself
+    if os.name == "posix":
+        dir_fd = os.open(path.parent, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
 
 
 def get_raster_metadata(file_path: str) -> Dict:
     """Extract metadata from a GeoTIFF file."""
-    with rasterio.open(file_path) as src:
-        bounds_4326 = transform_bounds(src.crs, "EPSG:4326", *src.bounds)
+    # Private handle per call, the reads run on several threads
+    with rasterio.open(file_path, sharing=False) as src:
+        # Only go through PROJ when the bounds are not already in EPSG:4326
+        if src.crs and src.crs.to_epsg() == 4326:
+            bounds_4326 = tuple(src.bounds)
+        else:
+            bounds_4326 = transform_bounds(src.crs, "EPSG:4326", *src.bounds)
         bbox = list(bounds_4326)
-        geometry = mapping(box(*bounds_4326))
+        # Axis-aligned footprint, same ring order as shapely's box()
+        minx, miny, maxx, maxy = bounds_4326
+        geometry = {
+            "type": "Polygon",
+            "coordinates": [
+                [[maxx, miny], [maxx, maxy], [minx, maxy], [minx, miny], [maxx, miny]]
+            ],
+        }
 
         metadata = {
             "bbox": bbox,
@@ -29,11 +112,142 @@ def get_raster_metadata(file_path: str) -> Dict:
         return metadata
 
 
+def read_raster_metadata(
+    file_paths: List[str],
+) -> List[Tuple[Optional[Dict], Optional[Exception]]]:
+    """
+    Extract metadata from several GeoTIFF files inside one GDAL environment.
+
+    Returns a (metadata, error) pair per file, a file that cannot be read gives
+    (None, error) instead of aborting the batch.
+    """
+    results = []
+    with rasterio.Env(**GDAL_ENV_OPTIONS):
+        for file_path in file_paths:
+            try:
+                results.append((get_raster_metadata(file_path), None))
+            except Exception as e:
+                results.append((None, e))
+    return results
+
+
+def get_num_workers(num_tasks: int) -> int:
+    """Number of threads for num_tasks I/O bound tasks."""
+    return max(1, min(32, (os.cpu_count() or 1) + 4, num_tasks))
+
+
+def read_all_raster_metadata(
+    file_paths: List[str],
+) -> List[Tuple[Optional[Dict], Optional[Exception]]]:
+    """
+    Read GeoTIFF headers concurrently, keeping the order of file_paths.
+
+    Returns a (metadata, error) pair per file, see read_raster_metadata.
+    """
+    # One contiguous batch per worker so each thread sets up its GDAL
+    # environment once (map keeps the file order)
+    num_workers = get_num_workers(len(file_paths))
+    batch_size = max(1, -(-len(file_paths) // num_workers))
+    batches = [
+        file_paths[i : i + batch_size] for i in range(0, len(file_paths), batch_size)
+    ]
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        return [
+            result
+            for batch in executor.map(read_raster_metadata, batches)
+            for result in batch
+        ]
+
+
+@lru_cache(maxsize=None)
 def parse_date_from_filename(filename: str) -> datetime:
     """Parse date from filename format: SIF_YYYYMMDD.tif"""
-    date_str = filename.replace("SIF_", "").replace(".tif", "")
-    date_obj = datetime.strptime(date_str, "%Y%m%d")
-    return date_obj.replace(tzinfo=timezone.utc)
+    # Fixed layout, so slice the digits instead of going through strptime
+    return datetime(
+        int(filename[4:8]),
+        int(filename[8:10]),
+        int(filename[10:12]),
+        tzinfo=timezone.utc,
+    )
+
+
+def create_stac_item(
+    file_path: str, github_raw_url: str, base_stac_url: str, metadata: Dict = None
+) -> Dict:
+    """
+    Create a CDSE-compliant STAC item for a GeoTIFF file.
+
+    Metadata is read from the file unless it is passed in.
+    """
+    filename = os.path.basename(file_path)
+    item_id = os.path.splitext(filename)[0]
+
+    if metadata is None:
+        metadata = get_raster_metadata(file_path)
+    date_time = parse_date_from_filename(filename)
+
+    item = {
+        "type": "Feature",
+        "stac_version": "0.9.0",
+        "stac_extensions": [
+            "https://stac-extensions.github.io/eo/v1.1.0/schema.json",
+            "https://stac-extensions.github.io/projection/v1.1.0/schema.json",
+        ],
+        "id": item_id,
+        "geometry": metadata["geometry"],
+        "bbox": metadata["bbox"],
+        "properties": {
+            "datetime": date_time.isoformat(),
+            "eo:bands": [
+                {
+                    "name": "SIF",
+                    "center_wavelength": 0.740,
+                    "full_width_half_max": 0.040,
+                }
+            ],
+        },
+        "assets": {
+            "data": {
+                "href": f"{github_raw_url}/{filename}",
+                "type": "image/tiff; application=geotiff",
+                "roles": ["data"],
+                "title": "SIF GeoTIFF",
+                "eo:bands": [0],  # Reference to band index
+            }
+        },
+        "links": [
+            {
+                "rel": "self",
+                "href": f"{base_stac_url}/sif-collection/{item_id}/{item_id}.json",
+                "type": "application/geo+json",
+            },
+            {
+                "rel": "collection",
+                "href": f"{base_stac_url}/sif-collection/collection.json",
+                "type": "application/json",
+            },
+            {
+                "rel": "parent",
+                "href": f"{base_stac_url}/sif-collection/collection.json",
+                "type": "application/json",
+            },
+            {
+                "rel": "root",
+                "href": f"{base_stac_url}/catalog.json",
+                "type": "application/json",
+            },
+        ],
+    }
+
+    # Add projection info if available
+    if metadata["crs"]:
+        crs_string = metadata["crs"]
+        if ":" in crs_string:
+            item["properties"]["proj:epsg"] = int(crs_string.split(":")[1])
+    item["properties"]["proj:shape"] = metadata["shape"]
+    item["properties"]["proj:transform"] = metadata["transform"]
+
+    return item
 
 
 def create_cdse_compliant_collection(
@@ -51,26 +265,78 @@ def create_cdse_compliant_collection(
     output_path.mkdir(parents=True, exist_ok=True)
 
     # Construct URLs
-    base_stac_url = (
-        github_repo_url.replace(
-            "https://github.com/", "https://raw.githubusercontent.com/"
-        ).rstrip("/")
-        + "/main/stac"
-    )
-
-    github_raw_url = (
-        github_repo_url.replace(
-            "https://github.com/", "https://raw.githubusercontent.com/"
-        ).rstrip("/")
-        + "/main/data"
-    )
+    raw_repo_url = github_repo_url.replace(
+        "https://github.com/", "https://raw.githubusercontent.com/"
+    ).rstrip("/")
+    base_stac_url = f"{raw_repo_url}/main/stac"
+
+    collection_url = f"{base_stac_url}/sif-collection"
+    collection_href = f"{collection_url}/collection.json"
+    catalog_href = f"{base_stac_url}/catalog.json"
+
+    github_raw_url = f"{raw_repo_url}/main/data"
+
+    # Find all GeoTIFF files, SIF_YYYYMMDD.tif names sort chronologically
+    with os.scandir(data_dir) as entries:
+        tif_names = sorted(
+            entry.name
+            for entry in entries
+            if entry.name.startswith("SIF_") and entry.name.endswith(".tif")
+        )
+    tif_paths = [os.path.join(data_dir, name) for name in tif_names]
+    print(f"Found {len(tif_paths)} GeoTIFF files")
+
+    # Read GeoTIFF headers concurrently, an unreadable file aborts the run
+    all_metadata = []
+    for metadata, error in read_all_raster_metadata(tif_paths):
+        if error is not None:
+            raise error
+        all_metadata.append(metadata)
+    num_workers = get_num_workers(len(tif_paths))
+
+    # Create the collection and item directories up front
+    collection_dir = output_path / "sif-collection"
+    collection_dir.mkdir(parents=True, exist_ok=True)
+    for filename in tif_names:
+        (collection_dir / filename[:-4]).mkdir(exist_ok=True)
 
-    # Find all GeoTIFF files
-    tif_files = sorted(Path(data_dir).glob("SIF_*.tif"))
-    print(f"Found {len(tif_files)} GeoTIFF files")
+    # Create items, collecting dates and bboxes for the collection
+    print("\nCreating items...")
+    dates = []
+    min_lon = min_lat = float("inf")
+    max_lon = max_lat = float("-inf")
+    items = []
+    item_files = []
+    first_metadata = None
+
+    for filename, tif_path, metadata in zip(tif_names, tif_paths, all_metadata):
+        item_id = filename[:-4]
+
+        if first_metadata is None:
+            first_metadata = metadata
+
+        dates.append(parse_date_from_filename(filename))
+
+        # Grow the spatial extent
+        bbox = metadata["bbox"]
+        if bbox[0] < min_lon:
+            min_lon = bbox[0]
+        if bbox[1] < min_lat:
+            min_lat = bbox[1]
+        if bbox[2] > max_lon:
+            max_lon = bbox[2]
+        if bbox[3] > max_lat:
+            max_lat = bbox[3]
+
+        items.append(
+            create_stac_item(tif_path, github_raw_url, base_stac_url, metadata)
+        )
+        item_files.append(collection_dir / item_id / f"{item_id}.json")
 
-    # Extract metadata from first file to get spatial extent
-    first_metadata = get_raster_metadata(str(tif_files[0]))
+    # Save items concurrently, file writes release the GIL
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        for item, _ in zip(items, executor.map(write_json, item_files, items)):
+            print(f"  Created: {item['id']}")
 
     # Get EPSG code
     epsg = 4326  # Default
@@ -83,24 +349,18 @@ def create_cdse_compliant_collection(
     transform = first_metadata["transform"]
     spatial_resolution = abs(transform[0])  # pixel size in degrees
 
-    # Collect all dates for temporal extent
-    dates = []
-    all_bboxes = []
-
-    for tif_file in tif_files:
-        date_time = parse_date_from_filename(tif_file.name)
-        dates.append(date_time)
-        metadata = get_raster_metadata(str(tif_file))
-        all_bboxes.append(metadata["bbox"])
-
-    # Calculate spatial extent
-    min_lon = min(bbox[0] for bbox in all_bboxes)
-    min_lat = min(bbox[1] for bbox in all_bboxes)
-    max_lon = max(bbox[2] for bbox in all_bboxes)
-    max_lat = max(bbox[3] for bbox in all_bboxes)
-
     start_date = min(dates)
     end_date = max(dates)
+    start_iso = start_date.isoformat()
+    end_iso = end_date.isoformat()
+
+    # Shared by the x and y cube dimensions
+    reference_system = {
+        "$schema": "https://proj.org/schemas/v0.2/projjson.schema.json",
+        "type": "GeodeticCRS",
+        "name": f"EPSG:{epsg}",
+        "id": {"authority": "EPSG", "code": epsg},
+    }
 
     # Create collection in CDSE format
     collection = {
@@ -120,34 +380,24 @@ def create_cdse_compliant_collection(
                 "axis": "x",
                 "extent": [min_lon, max_lon],
                 "step": spatial_resolution,
-                "reference_system": {
-                    "$schema": "https://proj.org/schemas/v0.2/projjson.schema.json",
-                    "type": "GeodeticCRS",
-                    "name": f"EPSG:{epsg}",
-                    "id": {"authority": "EPSG", "code": epsg},
-                },
+                "reference_system": reference_system,
             },
             "y": {
                 "type": "spatial",
                 "axis": "y",
                 "extent": [min_lat, max_lat],
                 "step": spatial_resolution,
-                "reference_system": {
-                    "$schema": "https://proj.org/schemas/v0.2/projjson.schema.json",
-                    "type": "GeodeticCRS",
-                    "name": f"EPSG:{epsg}",
-                    "id": {"authority": "EPSG", "code": epsg},
-                },
+                "reference_system": reference_system,
             },
             "t": {
                 "type": "temporal",
-                "extent": [start_date.isoformat(), end_date.isoformat()],
+                "extent": [start_iso, end_iso],
             },
             "bands": {"type": "bands", "values": ["SIF"]},
         },
         "extent": {
             "spatial": {"bbox": [[min_lon, min_lat, max_lon, max_lat]]},
-            "temporal": {"interval": [[start_date.isoformat(), end_date.isoformat()]]},
+            "temporal": {"interval": [[start_iso, end_iso]]},
         },
         "summaries": {
             "eo:bands": [
@@ -172,123 +422,39 @@ def create_cdse_compliant_collection(
         "links": [
             {
                 "rel": "self",
-                "href": f"{base_stac_url}/sif-collection/collection.json",
+                "href": collection_href,
                 "type": "application/json",
             },
             {
                 "rel": "root",
-                "href": f"{base_stac_url}/catalog.json",
+                "href": catalog_href,
                 "type": "application/json",
             },
             {
                 "rel": "parent",
-                "href": f"{base_stac_url}/catalog.json",
+                "href": catalog_href,
                 "type": "application/json",
             },
         ],
     }
 
     # Add item links
-    for tif_file in tif_files:
-        item_id = tif_file.stem
-        collection["links"].append(
+    collection["links"].extend(
+        [
             {
                 "rel": "item",
-                "href": f"{base_stac_url}/sif-collection/{item_id}/{item_id}.json",
+                "href": f"{collection_url}/{filename[:-4]}/{filename[:-4]}.json",
                 "type": "application/geo+json",
             }
-        )
+            for filename in tif_names
+        ]
+    )
 
     # Save collection
-    collection_dir = output_path / "sif-collection"
-    collection_dir.mkdir(parents=True, exist_ok=True)
-
     collection_file = collection_dir / "collection.json"
-    with open(collection_file, "w") as f:
-        json.dump(collection, f, indent=2)
-
-    print(f"✓ Created collection: {collection_file}")
-
-    # Create items
-    print("\nCreating items...")
-    for tif_file in tif_files:
-        filename = tif_file.name
-        item_id = tif_file.stem
-
-        date_time = parse_date_from_filename(filename)
-        metadata = get_raster_metadata(str(tif_file))
-
-        # Create item
-        item = {
-            "type": "Feature",
-            "stac_version": "0.9.0",
-            "stac_extensions": [
-                "https://stac-extensions.github.io/eo/v1.1.0/schema.json",
-                "https://stac-extensions.github.io/projection/v1.1.0/schema.json",
-            ],
-            "id": item_id,
-            "geometry": metadata["geometry"],
-            "bbox": metadata["bbox"],
-            "properties": {
-                "datetime": date_time.isoformat(),
-                "eo:bands": [
-                    {
-                        "name": "SIF",
-                        "center_wavelength": 0.740,
-                        "full_width_half_max": 0.040,
-                    }
-                ],
-            },
-            "assets": {
-                "data": {
-                    "href": f"{github_raw_url}/{filename}",
-                    "type": "image/tiff; application=geotiff",
-                    "roles": ["data"],
-                    "title": "SIF GeoTIFF",
-                    "eo:bands": [0],  # Reference to band index
-                }
-            },
-            "links": [
-                {
-                    "rel": "self",
-                    "href": f"{base_stac_url}/sif-collection/{item_id}/{item_id}.json",
-                    "type": "application/geo+json",
-                },
-                {
-                    "rel": "collection",
-                    "href": f"{base_stac_url}/sif-collection/collection.json",
-                    "type": "application/json",
-                },
-                {
-                    "rel": "parent",
-                    "href": f"{base_stac_url}/sif-collection/collection.json",
-                    "type": "application/json",
-                },
-                {
-                    "rel": "root",
-                    "href": f"{base_stac_url}/catalog.json",
-                    "type": "application/json",
-                },
-            ],
-        }
+    write_json(collection_file, collection)
 
-        # Add projection info if available
-        if metadata["crs"]:
-            crs_string = metadata["crs"]
-            if ":" in crs_string:
-                item["properties"]["proj:epsg"] = int(crs_string.split(":")[1])
-        item["properties"]["proj:shape"] = metadata["shape"]
-        item["properties"]["proj:transform"] = metadata["transform"]
-
-        # Save item
-        item_dir = collection_dir / item_id
-        item_dir.mkdir(parents=True, exist_ok=True)
-
-        item_file = item_dir / f"{item_id}.json"
-        with open(item_file, "w") as f:
-            json.dump(item, f, indent=2)
-
-        print(f"  Created: {item_id}")
+    print(f"\n✓ Created collection: {collection_file}")
 
     # Create root catalog
     catalog = {
@@ -300,17 +466,17 @@ def create_cdse_compliant_collection(
         "links": [
             {
                 "rel": "self",
-                "href": f"{base_stac_url}/catalog.json",
+                "href": catalog_href,
                 "type": "application/json",
             },
             {
                 "rel": "root",
-                "href": f"{base_stac_url}/catalog.json",
+                "href": catalog_href,
                 "type": "application/json",
             },
             {
                 "rel": "child",
-                "href": f"{base_stac_url}/sif-collection/collection.json",
+                "href": collection_href,
                 "type": "application/json",
                 "title": collection_title,
             },
@@ -318,8 +484,7 @@ def create_cdse_compliant_collection(
     }
 
     catalog_file = output_path / "catalog.json"
-    with open(catalog_file, "w") as f:
-        json.dump(catalog, f, indent=2)
+    write_json(catalog_file, catalog)
 
     print(f"\n✓ Created catalog: {catalog_file}")
 
@@ -327,8 +492,8 @@ def create_cdse_compliant_collection(
     print("CDSE-Compatible STAC Catalog Created!")
     print(f"{'=' * 70}")
     print(f"\nCollection URL (use this with CDSE):")
-    print(f"{base_stac_url}/sif-collection/collection.json")
-    print(f"\nTotal items: {len(tif_files)}")
+    print(collection_href)
+    print(f"\nTotal items: {len(tif_paths)}")
     print(f"Temporal extent: {start_date.date()} to {end_date.date()}")
     print(
         f"Spatial extent: [{min_lon:.2f}, {min_lat:.2f}, {max_lon:.2f}, {max_lat:.2f}]"
@@ -341,10 +506,11 @@ DATA_DIR = "data"  # Directory with your GeoTIFF files
 OUTPUT_DIR = "stac"  # Where STAC JSON files will be created
 GITHUB_REPO_URL = "https://github.com/dpabon/sif_dong_li_2023_sample"
 
-create_cdse_compliant_collection(
-    data_dir=DATA_DIR,
-    output_dir=OUTPUT_DIR,
-    github_repo_url=GITHUB_REPO_URL,
-    collection_title="SIF July 2023",
-    collection_description="Daily Solar-Induced Fluorescence measurements for July 2023",
-)
+if __name__ == "__main__":
+    create_cdse_compliant_collection(
+        data_dir=DATA_DIR,
+        output_dir=OUTPUT_DIR,
+        github_repo_url=GITHUB_REPO_URL,
+        collection_title="SIF July 2023",
+        collection_description="Daily Solar-Induced Fluorescence measurements for July 2023",
+    )
@@ -1,63 +1,158 @@
+import logging
 import os
-import json
+import re
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
+import numpy as np
 from create_stac_catalog import (
     create_stac_item,
-    get_raster_metadata,
     parse_date_from_filename,
+    read_all_raster_metadata,
+    read_json,
+    write_json,
 )
-import pystac
 
+# Matches the item ID without parsing the whole item JSON
+ITEM_ID_PATTERN = re.compile(rb'"id"\s*:\s*"([^"\\]+)"')
 
-def get_existing_items(collection_dir: Path) -> set:
-    """Get IDs of existing items in the collection."""
-    existing = set()
+logger = logging.getLogger(__name__)
 
-    for item_file in collection_dir.rglob("SIF_*.json"):
-        # Skip the collection.json itself
-        if item_file.name == "collection.json":
-            continue
 
+def iter_item_files(collection_dir: Path):
+    """Yield the paths of all SIF_*.json item files below collection_dir."""
+    stack = [str(collection_dir)]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.startswith("SIF_") and entry.name.endswith(".json"):
+                    yield entry.path
+
+
+def read_item_id(item_file: str):
+    """Read the ID of an item file, or None if it cannot be read."""
+    try:
+        match = ITEM_ID_PATTERN.search(Path(item_file).read_bytes())
+        if match:
+            return match.group(1).decode("utf-8")
+        return read_json(item_file)["id"]
+    except Exception as e:
+        logger.warning("Could not read %s: %s", item_file, e)
+        return None
+
+
+def get_existing_items(collection_dir: Path, collection_data: dict = None) -> set:
+    """
+    Get IDs of existing items in the collection.
+
+    collection_data is the already loaded collection.json, if available.
+    """
+    # The collection's item links are the index, use them when present
+    if collection_data is None:
         try:
-            with open(item_file) as f:
-                item_data = json.load(f)
-                existing.add(item_data["id"])
+            collection_data = read_json(Path(collection_dir) / "collection.json")
         except Exception as e:
-            print(f"Warning: Could not read {item_file}: {e}")
+            logger.warning("Could not read collection item links: %s", e)
+            collection_data = {}
+
+    existing = {
+        os.path.splitext(os.path.basename(link["href"]))[0]
+        for link in collection_data.get("links", [])
+        if link.get("rel") == "item"
+    }
+    if existing:
+        return existing
+
+    # Otherwise read the item files, they are small and independent so
+    # parse them concurrently
+    with ThreadPoolExecutor() as executor:
+        existing = set(executor.map(read_item_id, iter_item_files(collection_dir)))
+    existing.discard(None)
 
     return existing
 
 
-def update_collection_extent(collection_path: Path):
-    """Update the collection's temporal and spatial extent based on all items."""
+def read_item_summary(item_file: str):
+    """Read the ID, datetime and bbox of an item file."""
+    item_data = read_json(item_file)
+    dt_str = item_data.get("properties", {}).get("datetime")
+    return item_data["id"], dt_str, item_data.get("bbox")
 
-    with open(collection_path) as f:
-        collection_data = json.load(f)
 
-    # Find all item files
-    collection_dir = collection_path.parent
-    item_files = list(collection_dir.rglob("SIF_*.json"))
-    item_files = [f for f in item_files if f.name != "collection.json"]
+def scan_items(collection_dir: Path):
+    """
+    Read every item in the collection in a single walk.
 
-    if not item_files:
-        print("Warning: No items found in collection")
-        return
+    Returns the set of item IDs, the list of item datetimes (as strings) and
+    an (N, 4) array of item bboxes.
+    """
+    item_files = list(iter_item_files(collection_dir))
+
+    ids = set()
+    dt_strs = []
+    bboxes = np.empty((len(item_files), 4), dtype=np.float64)
+    num_bboxes = 0
+    with ThreadPoolExecutor() as executor:
+        # Consume the results as they arrive, no per-item list is kept
+        for item_id, dt_str, bbox in executor.map(read_item_summary, item_files):
+            ids.add(item_id)
+            if dt_str is not None:
+                dt_strs.append(dt_str)
+            if bbox is not None:
+                bboxes[num_bboxes] = bbox
+                num_bboxes += 1
+
+    return ids, dt_strs, bboxes[:num_bboxes]
+
+
+def update_collection_extent(
+    collection_path: Path,
+    new_datetimes: list = None,
+    new_bboxes: list = None,
+    collection_data: dict = None,
+):
+    """
+    Update the collection's temporal and spatial extent.
 
-    # Collect all datetimes and bboxes
-    datetimes = []
-    bboxes = []
+    If the datetimes and bboxes of newly added items are given, they are merged
+    into the collection's current extent. Otherwise every item is scanned.
+    collection_data is the already loaded collection.json, if available.
+    """
 
-    for item_file in item_files:
-        with open(item_file) as f:
-            item_data = json.load(f)
+    if collection_data is None:
+        collection_data = read_json(collection_path)
+
+    if new_datetimes is not None and new_bboxes is not None:
+        # Fold the new items into the stored extent
+        datetimes = list(new_datetimes)
+        bboxes = list(new_bboxes)
+        for interval in collection_data["extent"]["temporal"]["interval"]:
+            datetimes.extend(
+                datetime.fromisoformat(dt_str.replace("Z", "+00:00"))
+                for dt_str in interval
+                if dt_str
+            )
+        bboxes.extend(collection_data["extent"]["spatial"]["bbox"])
+        summary = f"{len(new_bboxes)} new items"
 
-            if "properties" in item_data and "datetime" in item_data["properties"]:
-                dt_str = item_data["properties"]["datetime"]
-                datetimes.append(datetime.fromisoformat(dt_str.replace("Z", "+00:00")))
+    else:
+        ids, dt_strs, bboxes = scan_items(collection_path.parent)
+
+        if not ids:
+            print("Warning: No items found in collection")
+            return
+
+        # ISO 8601 UTC strings sort in time order, only parse the ends
+        datetimes = []
+        if dt_strs:
+            datetimes = [
+                datetime.fromisoformat(dt_str.replace("Z", "+00:00"))
+                for dt_str in (min(dt_strs), max(dt_strs))
+            ]
 
-            if "bbox" in item_data:
-                bboxes.append(item_data["bbox"])
+        summary = f"{len(ids)} items"
 
     # Update temporal extent
     if datetimes:
@@ -79,11 +174,10 @@ def update_collection_extent(collection_path: Path):
             ]
 
     # Update spatial extent
-    if bboxes:
-        min_lon = min(bbox[0] for bbox in bboxes)
-        min_lat = min(bbox[1] for bbox in bboxes)
-        max_lon = max(bbox[2] for bbox in bboxes)
-        max_lat = max(bbox[3] for bbox in bboxes)
+    if len(bboxes):
+        bbox_arr = np.asarray(bboxes, dtype=np.float64)
+        min_lon, min_lat = bbox_arr[:, :2].min(axis=0).tolist()
+        max_lon, max_lat = bbox_arr[:, 2:].max(axis=0).tolist()
 
         collection_data["extent"]["spatial"]["bbox"] = [
             [min_lon, min_lat, max_lon, max_lat]
@@ -97,16 +191,19 @@ def update_collection_extent(collection_path: Path):
                 collection_data["cube:dimensions"]["y"]["extent"] = [min_lat, max_lat]
 
     # Write updated collection
-    with open(collection_path, "w") as f:
-        json.dump(collection_data, f, indent=2)
+    write_json(collection_path, collection_data, atomic=True)
 
-    print(f"✓ Updated collection extent: {len(item_files)} items")
+    print(f"✓ Updated collection extent: {summary}")
     print(f"  Temporal: {start_date.date()} to {end_date.date()}")
     print(f"  Spatial: [{min_lon:.2f}, {min_lat:.2f}, {max_lon:.2f}, {max_lat:.2f}]")
 
 
 def add_new_items(
-    data_dir: str, stac_dir: str, github_repo_url: str, force: bool = False
+    data_dir: str,
+    stac_dir: str,
+    github_repo_url: str,
+    force: bool = False,
+    verbose: bool = False,
 ):
     """
     Add new items to existing STAC catalog.
@@ -116,92 +213,129 @@ def add_new_items(
         stac_dir: Directory containing existing STAC catalog
         github_repo_url: GitHub repository URL
         force: If True, regenerate all items (even existing ones)
+        verbose: If True, print a line for every item created
     """
 
     data_path = Path(data_dir)
     stac_path = Path(stac_dir)
 
-    # Check if catalog exists
-    catalog_file = stac_path / "catalog.json"
-    if not catalog_file.exists():
-        print(f"Error: Catalog not found at {catalog_file}")
-        print("Run create_stac_catalog.py first to create the initial catalog.")
-        return
-
-    # Load collection
+    # Load collection, a missing file means there is no catalog yet
     collection_dir = stac_path / "sif-collection"
     collection_file = collection_dir / "collection.json"
 
-    if not collection_file.exists():
+    try:
+        collection_data = read_json(collection_file)
+    except FileNotFoundError:
         print(f"Error: Collection not found at {collection_file}")
-        return
+        print("Run create_stac_catalog.py first to create the initial catalog.")
+        return 0
 
-    collection = pystac.Collection.from_file(str(collection_file))
+    # Find all GeoTIFF files
+    with os.scandir(data_path) as entries:
+        tif_entries = [
+            entry
+            for entry in entries
+            if entry.name.startswith("SIF_") and entry.name.endswith(".tif")
+        ]
+    print(f"Found {len(tif_entries)} GeoTIFF files in {data_dir}")
 
     # Get existing items
     if not force:
-        existing_items = get_existing_items(collection_dir)
+        existing_items = get_existing_items(collection_dir, collection_data)
         print(f"Found {len(existing_items)} existing items in catalog")
     else:
         existing_items = set()
         print("Force mode: regenerating all items")
 
-    # Construct GitHub raw URL
-    github_raw_url = (
-        github_repo_url.replace(
-            "https://github.com/", "https://raw.githubusercontent.com/"
-        ).rstrip("/")
-        + "/main/data"
-    )
+    # Construct URLs
+    raw_repo_url = github_repo_url.replace(
+        "https://github.com/", "https://raw.githubusercontent.com/"
+    ).rstrip("/")
+    base_stac_url = f"{raw_repo_url}/main/stac"
 
-    # Find all GeoTIFF files
-    tif_files = sorted(data_path.glob("SIF_*.tif"))
-    print(f"Found {len(tif_files)} GeoTIFF files in {data_dir}")
+    github_raw_url = f"{raw_repo_url}/main/data"
 
-    # Track new items
+    # Keep only files without an item (all of them in force mode)
+    todo_entries = [
+        entry for entry in tif_entries if force or entry.name[:-4] not in existing_items
+    ]
+    todo_entries.sort(key=lambda entry: entry.name)
+    num_skipped = len(tif_entries) - len(todo_entries)
+
+    # Track new items and their extent
     new_items = []
-    skipped_items = []
+    new_item_data = []
+    new_datetimes = []
+    new_bboxes = []
 
-    # Process each file
-    for tif_file in tif_files:
-        item_id = tif_file.stem  # filename without extension
+    # Read the GeoTIFF headers concurrently
+    all_metadata = read_all_raster_metadata([entry.path for entry in todo_entries])
 
-        # Skip if already exists (unless force mode)
-        if not force and item_id in existing_items:
-            skipped_items.append(item_id)
-            continue
+    # Process each new file
+    for tif_entry, (metadata, error) in zip(todo_entries, all_metadata):
+        item_id = tif_entry.name[:-4]  # filename without extension
 
-        print(f"Creating item: {item_id}...")
+        if verbose:
+            print(f"Creating item: {item_id}...")
+
+        if error is not None:
+            print(f"  Error reading {tif_entry.name}: {error}")
+            continue
 
         try:
             # Create STAC item
-            item = create_stac_item(str(tif_file), github_raw_url, collection.id)
+            item = create_stac_item(
+                tif_entry.path, github_raw_url, base_stac_url, metadata
+            )
 
-            # Add to collection
-            collection.add_item(item)
             new_items.append(item_id)
+            new_item_data.append(item)
+            new_datetimes.append(parse_date_from_filename(tif_entry.name))
+            new_bboxes.append(item["bbox"])
 
         except Exception as e:
-            print(f"  Error creating item for {tif_file.name}: {e}")
+            print(f"  Error creating item for {tif_entry.name}: {e}")
             continue
 
     # Save updated catalog
     if new_items or force:
         print(f"\nSaving catalog with {len(new_items)} new items...")
 
-        # Normalize hrefs
-        collection.normalize_hrefs(str(stac_path / "sif-collection"))
-
-        # Save collection
-        collection.save(catalog_type=pystac.CatalogType.SELF_CONTAINED)
-
-        # Update collection extent
-        update_collection_extent(collection_file)
+        # Write only the new items, existing item files are left untouched
+        for item in new_item_data:
+            item_dir = collection_dir / item["id"]
+            item_dir.mkdir(exist_ok=True)
+            write_json(item_dir / f"{item['id']}.json", item)
+
+        # Link the new items from the collection, one link per item ID (as in
+        # get_existing_items) so a regenerated item replaces its old link
+        item_links = {
+            os.path.splitext(os.path.basename(link["href"]))[0]: link
+            for link in collection_data["links"]
+            if link.get("rel") == "item"
+        }
+        for item_id in new_items:
+            href = f"{base_stac_url}/sif-collection/{item_id}/{item_id}.json"
+            if item_id in item_links:
+                item_links[item_id]["href"] = href
+            else:
+                collection_data["links"].append(
+                    {"rel": "item", "href": href, "type": "application/geo+json"}
+                )
+
+        # Update collection extent and write the collection, rescanning every
+        # item only in force mode
+        if force:
+            update_collection_extent(collection_file, collection_data=collection_data)
+        else:
+            update_collection_extent(
+                collection_file, new_datetimes, new_bboxes, collection_data
+            )
 
         print(f"\n✓ Catalog updated successfully!")
         print(f"  New items added: {len(new_items)}")
-        print(f"  Existing items: {len(skipped_items)}")
-        print(f"  Total items: {len(new_items) + len(skipped_items)}")
+        print(f"  Existing items: {num_skipped}")
+        print(f"  Total items: {len(new_items) + num_skipped}")
 
         if new_items:
             print(f"\nNew items:")
@@ -243,6 +377,11 @@ def main():
         action="store_true",
         help="Regenerate all items, including existing ones",
     )
+    parser.add_argument(
+        "--verbose",
+        action="store_true",
+        help="Print progress for every item created",
+    )
 
     args = parser.parse_args()
 
@@ -256,6 +395,7 @@ def main():
         stac_dir=args.stac_dir,
         github_repo_url=args.github_url,
         force=args.force,
+        verbose=args.verbose,
     )
 
     if num_added > 0: